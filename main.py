@@ -9,7 +9,14 @@ containing specific strings, downloads them, and extracts formatted XML content.
 import os
 import re
 import gzip
-import tempfile
+import io
+import mmap
+import shlex
+import base64
+import socket
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 from typing import Optional, List, Tuple
 
@@ -17,17 +24,70 @@ import click
 import paramiko
 from lxml import etree
 
+try:
+    import pyzstd  # Needed for .zst logs only
+except ImportError:
+    pyzstd = None
+
+try:
+    import zstandard  # Optional - reusable decompression contexts, preferred over pyzstd when installed
+except ImportError:
+    zstandard = None
+
+try:
+    from isal import igzip as gzip_mod  # Optional - ISA-L inflate, same API as gzip but faster
+except ImportError:
+    gzip_mod = gzip
+
+
+# Prefix used by the remote search script to tag matching file names
+MATCH_PREFIX = "MATCH:"
+SEARCH_PARALLELISM = 8  # Concurrent grep processes on the server
+SEARCH_FILES_PER_GREP = 4  # Files handed to each grep process
+
+# Opening SOAP envelope tag (<soap:Envelope ...>, <s:Envelope>, <Envelope>) capturing its prefix
+ENVELOPE_START_RE = re.compile(rb'<((?:[\w.-]*:)?)Envelope\b[^>]*>', re.IGNORECASE)
+RESPONSE_MARKER_RE = re.compile(rb'GetShipmentResponse', re.IGNORECASE)
+
+# Network tuning - paramiko's 64 KiB default window stalls SFTP on anything but a LAN
+SSH_PORT = 22
+SOCKET_BUFFER_SIZE = 32 << 20  # 32 MiB SO_SNDBUF / SO_RCVBUF
+TRANSPORT_WINDOW_SIZE = 1 << 27  # 128 MiB SSH channel window
+REKEY_BYTES = 1 << 40  # Avoid rekeying in the middle of large transfers
+MAX_PACKET_SIZE = 128 * 1024  # Largest channel packet; OpenSSH rejects packets over 256 KiB
+COPY_CHUNK_SIZE = 1 << 20  # Local read/write block size
+SCAN_BLOCK_SIZE = 8 << 20  # Block size when counting lines in extracted logs
+ZSTD_MAX_WINDOW_SIZE = 1 << 31  # Accept logs compressed with --long windows up to 2 GiB
+# Each fallback search worker may hold a shell and an SFTP channel; 4 workers plus the
+# main thread's two stay within OpenSSH's default MaxSessions of 10
+FALLBACK_SEARCH_WORKERS = 4
+IN_MEMORY_SEARCH_LIMIT = 64 * 1024 * 1024  # Plain logs up to this size are searched in memory
+
+# Shared XML parser - blank text is dropped so pretty_print can re-indent the document
+XML_PARSER = etree.XMLParser(remove_blank_text=True, huge_tree=True)
+
 
 class TransferLogProcessor:
     """Main class for processing transfer logs from SSH server."""
     
-    def __init__(self, hostname: str, username: str, key_filename: Optional[str] = None):
+    def __init__(self, hostname: str, username: str, key_filename: Optional[str] = None,
+                 compress: bool = False):
         """Initialize SSH connection parameters."""
         self.hostname = hostname
         self.username = username
         self.key_filename = key_filename
+        self.compress = compress
         self.ssh = None
         self.sftp = None
+        # Persistent remote shell used by _run, so each command doesn't open a new SSH channel
+        self._shell = None
+        # SFTP clients, shells and zstd contexts are not thread-safe, so worker threads get their own
+        self._thread_local = threading.local()
+        self._worker_channels = []
+        self._worker_channels_lock = threading.Lock()
+        # Set once the fallback search has a match, so the searches still running give up
+        self._search_cancelled = threading.Event()
+        self._shell_sentinel = f"__END_{uuid.uuid4().hex}__".encode()
         
     def connect(self) -> bool:
         """Establish SSH connection to the server using SSH keys."""
@@ -43,7 +103,9 @@ class TransferLogProcessor:
                     self.ssh.connect(
                         hostname=self.hostname,
                         username=self.username,
-                        key_filename=self.key_filename
+                        key_filename=self.key_filename,
+                        compress=self.compress,
+                        sock=self._open_socket()
                     )
                 except paramiko.ssh_exception.PasswordRequiredException:
                     # Key is encrypted, ask for passphrase
@@ -52,16 +114,22 @@ class TransferLogProcessor:
                         hostname=self.hostname,
                         username=self.username,
                         key_filename=self.key_filename,
-                        passphrase=passphrase
+                        passphrase=passphrase,
+                        compress=self.compress,
+                        sock=self._open_socket()
                     )
             else:
                 click.echo(f"Connecting to {self.hostname} using default SSH keys...")
                 self.ssh.connect(
                     hostname=self.hostname,
                     username=self.username,
-                    look_for_keys=True
+                    look_for_keys=True,
+                    compress=self.compress,
+                    sock=self._open_socket()
                 )
             
+            self._tune_transport()
+            self._shell = self._open_shell()
             self.sftp = self.ssh.open_sftp()
             click.echo("✅ SSH connection established successfully!")
             return True
@@ -70,8 +138,128 @@ class TransferLogProcessor:
             click.echo(f"❌ SSH connection failed: {e}")
             return False
     
+    def _open_socket(self) -> socket.socket:
+        """Open a TCP connection to the server with large buffers and Nagle disabled."""
+        last_error = None
+        for family, socktype, proto, _, address in socket.getaddrinfo(self.hostname, SSH_PORT, 0, socket.SOCK_STREAM):
+            sock = socket.socket(family, socktype, proto)
+            try:
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                # Buffers must be sized before connect() so the TCP window scale is negotiated for them
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, SOCKET_BUFFER_SIZE)
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, SOCKET_BUFFER_SIZE)
+                sock.connect(address)
+                return sock
+            except OSError as e:
+                sock.close()
+                last_error = e
+        raise last_error or OSError(f"Could not resolve {self.hostname}")
+    
+    def _tune_transport(self):
+        """Raise the SSH window and packet sizes so SFTP and exec channels are not throttled."""
+        transport = self.ssh.get_transport()
+        # Channels opened from now on (SFTP included) pick up these defaults
+        transport.default_window_size = TRANSPORT_WINDOW_SIZE
+        transport.default_max_packet_size = MAX_PACKET_SIZE
+        transport.packetizer.REKEY_BYTES = REKEY_BYTES
+    
+    def _get_sftp(self) -> paramiko.SFTPClient:
+        """Return the SFTP client to use from the current thread."""
+        if threading.current_thread() is threading.main_thread():
+            return self.sftp
+        
+        sftp = getattr(self._thread_local, 'sftp', None)
+        if sftp is None:
+            # Each SFTP client is a separate channel multiplexed over the shared transport
+            sftp = self.ssh.open_sftp()
+            self._thread_local.sftp = sftp
+            with self._worker_channels_lock:
+                self._worker_channels.append(sftp)
+        return sftp
+    
+    def _get_shell(self) -> Tuple[paramiko.Channel, paramiko.ChannelFile, paramiko.ChannelFile]:
+        """Return the persistent remote shell to use from the current thread."""
+        if threading.current_thread() is threading.main_thread():
+            return self._shell
+        
+        shell = getattr(self._thread_local, 'shell', None)
+        if shell is None:
+            shell = self._open_shell()
+            self._thread_local.shell = shell
+            with self._worker_channels_lock:
+                self._worker_channels.append(shell[0])
+        return shell
+    
+    def _close_worker_channels(self):
+        """Close the SFTP and shell channels opened by worker threads."""
+        with self._worker_channels_lock:
+            channels, self._worker_channels = self._worker_channels, []
+        for channel in channels:
+            channel.close()
+    
+    def _get_zstd_decompressor(self) -> 'zstandard.ZstdDecompressor':
+        """Return the zstd decompression context for the current thread, reused across files."""
+        dctx = getattr(self._thread_local, 'zstd_dctx', None)
+        if dctx is None:
+            dctx = zstandard.ZstdDecompressor(max_window_size=ZSTD_MAX_WINDOW_SIZE)
+            self._thread_local.zstd_dctx = dctx
+        return dctx
+    
+    def _open_remote(self, remote_path: str, file_size: Optional[int] = None) -> paramiko.SFTPFile:
+        """Open a remote file for reading with all read requests pipelined ahead of the reader."""
+        sftp = self._get_sftp()
+        if file_size is None:
+            file_size = sftp.stat(remote_path).st_size
+        
+        # Keep paramiko's 32 KiB request size: OpenSSH answers larger reads short, and a short
+        # prefetch reply makes paramiko drop back to synchronous reads for the rest of the file
+        remote_file = sftp.open(remote_path, 'rb')
+        remote_file.prefetch(file_size)
+        return remote_file
+    
+    def _open_shell(self) -> Tuple[paramiko.Channel, paramiko.ChannelFile, paramiko.ChannelFile]:
+        """Start a persistent remote shell for _run and return its channel with stdout and stderr."""
+        channel = self.ssh.get_transport().open_session()
+        # No pty: no prompt, no echo and no CRLF translation to strip from the output
+        channel.exec_command("bash --noprofile --norc")
+        return channel, channel.makefile('rb'), channel.makefile_stderr('rb')
+    
+    def _run(self, command: str, input_data: Optional[bytes] = None) -> Tuple[int, bytes, bytes]:
+        """Run a command in the persistent remote shell and return its exit status, stdout and stderr."""
+        sentinel = self._shell_sentinel.decode()
+        if input_data is None:
+            # Never let a command read from the shell's own stdin - that is where the next command comes from
+            script = f"( {command}\n) < /dev/null\n"
+        else:
+            encoded = base64.encodebytes(input_data).decode()
+            script = f"{{ base64 -d | ( {command}\n); }} <<'{sentinel}'\n{encoded}{sentinel}\n"
+        # A newline before the sentinel keeps it on its own line even if the output has no trailing newline
+        script += f"printf '\\n%s %d\\n' {sentinel} \"$?\"\nprintf '\\n%s\\n' {sentinel} >&2\n"
+        
+        channel, stdout_file, stderr_file = self._get_shell()
+        channel.sendall(script.encode())
+        stdout, status = self._read_until_sentinel(stdout_file)
+        stderr, _ = self._read_until_sentinel(stderr_file)
+        return status, stdout, stderr
+    
+    def _read_until_sentinel(self, stream) -> Tuple[bytes, int]:
+        """Read shell output up to the sentinel line and return it with the number that follows it."""
+        lines = []
+        while True:
+            line = stream.readline()
+            if not line:
+                raise EOFError("Remote shell closed unexpectedly")
+            if line.startswith(self._shell_sentinel):
+                value = line[len(self._shell_sentinel):].strip()
+                # Drop the newline printed in front of the sentinel
+                return b''.join(lines)[:-1], int(value) if value else 0
+            lines.append(line)
+    
     def disconnect(self):
         """Close SSH and SFTP connections."""
+        self._close_worker_channels()
+        if self._shell:
+            self._shell[0].close()
         if self.sftp:
             self.sftp.close()
         if self.ssh:
@@ -86,17 +274,24 @@ class TransferLogProcessor:
             size /= 1024.0
         return f"{size:.2f} TB"
     
-    def search_log_files(self, log_dir: str, file_pattern: str, search_string: str) -> List[str]:
-        """Search for log files matching pattern and containing search string using fast server-side commands."""
+    def search_log_files(self, log_dir: str, file_pattern: re.Pattern, search_string: str,
+                         file_prefix: str = '') -> List[str]:
+        """Search for log files matching pattern and containing search string using fast server-side commands.
+        
+        file_prefix is a literal prefix of every name the pattern matches, used to skip other files cheaply.
+        """
         try:
             click.echo(f"Searching in directory: {log_dir}")
-            click.echo(f"File pattern: {file_pattern}")
+            click.echo(f"File pattern: {file_pattern.pattern}")
             click.echo(f"Search string: {search_string}")
             
-            # First, list files matching the pattern using server-side commands
-            stdin, stdout, stderr = self.ssh.exec_command(f"cd {log_dir} && ls -1 | grep -E '{file_pattern}'")
-            file_list_output = stdout.read().decode().strip()
-            error = stderr.read().decode().strip()
+            # First, list files matching the pattern using server-side commands - only matching names
+            # cross the wire. Anchored like re.match so e.g. "xjan.log" doesn't match the "jan" pattern
+            status, stdout, stderr = self._run(
+                f"ls -1 -- {shlex.quote(log_dir)} | grep -E -- {shlex.quote('^' + file_pattern.pattern)}"
+            )
+            file_list_output = stdout.decode().strip()
+            error = stderr.decode().strip()
             
             if error:
                 click.echo(f"Warning: {error}")
@@ -108,70 +303,30 @@ class TransferLogProcessor:
             pattern_files = file_list_output.split('\n')
             click.echo(f"Found {len(pattern_files)} files matching pattern: {pattern_files}\n")
             
-            # Use server-side grep to search for the string in all files at once
-            matching_files = []
+            # Run all greps in a single remote script instead of one command per file type.
+            # File names go over stdin NUL-separated, so quoting and ARG_MAX are not an issue.
+            script = self._build_search_script(log_dir, search_string)
+            status, stdout, stderr = self._run(
+                f"bash -c {shlex.quote(script)}",
+                input_data=b'\0'.join(f.encode() for f in pattern_files)
+            )
+            output = stdout.decode(errors='replace')
             
-            # Build grep commands for different file types
-            regular_files = [f for f in pattern_files if not f.endswith(('.gz', '.zst'))]
-            gz_files = [f for f in pattern_files if f.endswith('.gz')]
-            zst_files = [f for f in pattern_files if f.endswith('.zst')]
-            
-            # Search regular files
-            if regular_files and not matching_files:
-                files_str = ' '.join([f"'{f}'" for f in regular_files])
-                cmd = f"cd {log_dir} && grep -l '{search_string}' {files_str} 2>/dev/null | head -1 || true"
-                stdin, stdout, stderr = self.ssh.exec_command(cmd)
-                output = stdout.read().decode().strip()
-                if output:
-                    filename = output.strip()
-                    matching_files.append(f"{log_dir}/{filename}")
-                    click.echo(f"✅ Found '{search_string}' in: {filename}")
-                    click.echo(f"⏩ Stopping search - found match in first file")
-                    return matching_files
+            # Like grep: 0 is a match, 1 is no match, anything else means the search could not run
+            if status not in (0, 1):
+                click.echo(f"❌ Server-side search failed (exit status {status}): {stderr.decode(errors='replace').strip()}")
+                click.echo("Falling back to slow file-by-file search...")
+                return self._search_log_files_fallback(log_dir, file_pattern, search_string, file_prefix)
             
-            # Search gzip files
-            if gz_files and not matching_files:
-                files_str = ' '.join([f"'{f}'" for f in gz_files])
-                cmd = f"cd {log_dir} && zgrep -l '{search_string}' {files_str} 2>/dev/null | head -1 || true"
-                stdin, stdout, stderr = self.ssh.exec_command(cmd)
-                output = stdout.read().decode().strip()
-                if output:
-                    filename = output.strip()
+            matching_files = []
+            for line in output.split('\n'):
+                if line.startswith(MATCH_PREFIX):
+                    filename = line[len(MATCH_PREFIX):]
                     matching_files.append(f"{log_dir}/{filename}")
                     click.echo(f"✅ Found '{search_string}' in: {filename}")
                     click.echo(f"⏩ Stopping search - found match in first file")
                     return matching_files
             
-            # Search zstd files
-            if zst_files and not matching_files:
-                # Check if zstdgrep is available
-                stdin, stdout, stderr = self.ssh.exec_command("which zstdgrep 2>/dev/null")
-                zstdgrep_available = bool(stdout.read().decode().strip())
-                
-                if zstdgrep_available:
-                    files_str = ' '.join([f"'{f}'" for f in zst_files])
-                    cmd = f"cd {log_dir} && zstdgrep -l '{search_string}' {files_str} 2>/dev/null | head -1 || true"
-                    stdin, stdout, stderr = self.ssh.exec_command(cmd)
-                    output = stdout.read().decode().strip()
-                    if output:
-                        filename = output.strip()
-                        matching_files.append(f"{log_dir}/{filename}")
-                        click.echo(f"✅ Found '{search_string}' in: {filename}")
-                        click.echo(f"⏩ Stopping search - found match in first file")
-                        return matching_files
-                else:
-                    # Fallback: use zstdcat with grep for each file
-                    click.echo("zstdgrep not available, using zstdcat fallback...")
-                    for zst_file in zst_files:
-                        cmd = f"cd {log_dir} && zstdcat '{zst_file}' 2>/dev/null | grep -q '{search_string}' && echo '{zst_file}' || true"
-                        stdin, stdout, stderr = self.ssh.exec_command(cmd)
-                        output = stdout.read().decode().strip()
-                        if output:
-                            matching_files.append(f"{log_dir}/{output}")
-                            click.echo(f"✅ Found '{search_string}' in: {output}")
-                            click.echo(f"⏩ Stopping search - found match in first file")
-                            return matching_files
-            
             if not matching_files:
                 click.echo(f"❌ String '{search_string}' not found in any matching files")
             
@@ -180,29 +335,85 @@ class TransferLogProcessor:
         except Exception as e:
             click.echo(f"❌ Error in fast search: {e}")
             click.echo("Falling back to slow file-by-file search...")
-            return self._search_log_files_fallback(log_dir, file_pattern, search_string)
+            return self._search_log_files_fallback(log_dir, file_pattern, search_string, file_prefix)
+    
+    def _build_search_script(self, log_dir: str, search_string: str) -> str:
+        """Build one shell script that greps regular, gzip and zstd files and prints the first match.
+        
+        The script reads NUL-separated file names from stdin.
+        """
+        pattern = shlex.quote(search_string)
+        xargs = f"xargs -0 -n {SEARCH_FILES_PER_GREP} -P {SEARCH_PARALLELISM}"
+        return '\n'.join([
+            f"cd {shlex.quote(log_dir)} || exit 2",
+            "mapfile -d '' -t files || exit 2",
+            "regular=(); gz=(); zst=()",
+            'for f in "${files[@]}"; do',
+            '  case "$f" in *.gz) gz+=("$f") ;; *.zst) zst+=("$f") ;; *) regular+=("$f") ;; esac',
+            "done",
+            # Report the first hit as "MATCH:<file>" and stop the script
+            f'report() {{ if [ -n "$1" ]; then echo "{MATCH_PREFIX}$1"; exit 0; fi; }}',
+            # A missing tool exits with 127 so the caller can fall back instead of reporting "not found"
+            'search() {',
+            '  local cmd=$1; shift',
+            '  [ $# -gt 0 ] || return 0',
+            '  command -v "$cmd" >/dev/null || exit 127',
+            f'  report "$(printf \'%s\\0\' "$@" | {xargs} $cmd -F -l -- {pattern} 2>/dev/null | head -n 1)"',
+            '}',
+            'search grep "${regular[@]}"',
+            'search zgrep "${gz[@]}"',
+            "if command -v zstdgrep >/dev/null 2>&1; then",
+            '  search zstdgrep "${zst[@]}"',
+            "elif [ ${#zst[@]} -gt 0 ]; then",
+            "  command -v zstdcat >/dev/null || exit 127",
+            # Same as zstdgrep -l: one zstdcat|grep per file, run in parallel within this single exec
+            '  report "$(printf \'%s\\0\' "${zst[@]}" | '
+            f'xargs -0 -n 1 -P {SEARCH_PARALLELISM} sh -c \'zstdcat -- "$1" 2>/dev/null | grep -F -q -- "$0" && echo "$1"\' '
+            f'{pattern} 2>/dev/null | head -n 1)"',
+            "fi",
+            "exit 1",
+        ])
     
-    def _search_log_files_fallback(self, log_dir: str, file_pattern: str, search_string: str) -> List[str]:
+    def _search_log_files_fallback(self, log_dir: str, file_pattern: re.Pattern, search_string: str,
+                                   file_prefix: str = '') -> List[str]:
         """Fallback method using file-by-file search when fast method fails."""
         try:
             click.echo("Using fallback method...")
             
-            # List files in the log directory using SFTP
-            files = self.sftp.listdir(log_dir)
+            # List files in the log directory using SFTP - the attributes carry sizes for prefetching
+            file_sizes = {attr.filename: attr.st_size for attr in self.sftp.listdir_attr(log_dir)}
             matching_files = []
             
-            # Filter files by pattern
-            pattern_files = [f for f in files if re.match(file_pattern, f)]
+            # Filter files by pattern - the plain prefix check rejects unrelated names before the regex
+            pattern_files = [f for f in file_sizes if f.startswith(file_prefix) and file_pattern.match(f)]
             click.echo(f"Found {len(pattern_files)} files matching pattern")
-            
-            # Search for the string in matching files - stop at first match
-            for filename in pattern_files:
-                file_path = f"{log_dir}/{filename}"
-                if self._file_contains_string(file_path, search_string):
-                    matching_files.append(file_path)
-                    click.echo(f"✅ Found '{search_string}' in: {filename}")
-                    click.echo(f"⏩ Stopping search - found match in first file")
-                    break  # Stop searching after finding first match
+            if not pattern_files:
+                return matching_files
+            
+            # Search matching files concurrently, each worker on its own channels - stop at first match.
+            # The identity is ASCII, so files are searched as raw bytes without decoding them.
+            needle = search_string.encode('utf-8')
+            self._search_cancelled.clear()
+            executor = ThreadPoolExecutor(max_workers=FALLBACK_SEARCH_WORKERS)
+            try:
+                futures = {
+                    executor.submit(self._file_contains_string, f"{log_dir}/{filename}", needle, file_sizes[filename]): filename
+                    for filename in pattern_files
+                }
+                for future in as_completed(futures):
+                    if future.result():
+                        filename = futures[future]
+                        matching_files.append(f"{log_dir}/{filename}")
+                        click.echo(f"✅ Found '{search_string}' in: {filename}")
+                        click.echo(f"⏩ Stopping search - found match in first file")
+                        break  # Stop searching after finding first match
+            finally:
+                # Stop the searches still running before waiting for them: streaming loops check the
+                # event, and closing their channels aborts remote greps and pending SFTP reads
+                self._search_cancelled.set()
+                self._close_worker_channels()
+                executor.shutdown(wait=True, cancel_futures=True)
+                self._close_worker_channels()
             
             if not matching_files:
                 click.echo(f"❌ String '{search_string}' not found in any matching files")
@@ -213,305 +424,251 @@ class TransferLogProcessor:
             click.echo(f"❌ Error in fallback search: {e}")
             return []
     
-    def _file_contains_string(self, file_path: str, search_string: str) -> bool:
-        """Check if a file contains the search string."""
+    def _file_contains_string(self, file_path: str, needle: bytes, file_size: Optional[int] = None) -> bool:
+        """Check if a remote file contains the search bytes, preferably without downloading it."""
+        if self._search_cancelled.is_set():
+            return False
+        
         try:
-            filename = Path(file_path).name
+            filename = file_path.rpartition('/')[2]
+            path = shlex.quote(file_path)
+            pattern = shlex.quote(needle.decode('utf-8'))
             
-            # Handle different file types
+            # Handle different file types - grep runs on the server, only the answer crosses the wire
             if filename.endswith('.zst'):
-                return self._search_in_zst_file(file_path, search_string)
+                cmd = f"command -v zstdcat >/dev/null || exit 127; zstdcat -- {path} 2>/dev/null | grep -F -q -- {pattern}"
             elif filename.endswith('.gz'):
-                return self._search_in_gz_file(file_path, search_string)
+                cmd = f"zgrep -F -q -- {pattern} {path} 2>/dev/null"
             else:
-                return self._search_in_text_file(file_path, search_string)
+                cmd = f"grep -F -q -- {pattern} {path} 2>/dev/null"
+            
+            try:
+                status = self._run(cmd)[0]
+            except Exception:
+                status = None
+            
+            # grep exits with 0 on a match and 1 on no match; anything else means the search itself failed
+            if status in (0, 1):
+                return status == 0
+            if self._search_cancelled.is_set():
+                return False
+            
+            # Remote tools are missing or the shell is gone - stream the file over SFTP and search locally
+            if filename.endswith('.zst'):
+                return self._search_in_zst_file(file_path, needle, file_size)
+            elif filename.endswith('.gz'):
+                return self._search_in_gz_file(file_path, needle, file_size)
+            else:
+                return self._search_in_text_file(file_path, needle, file_size)
                 
         except Exception as e:
-            click.echo(f"Warning: Could not read {file_path}: {e}")
+            if not self._search_cancelled.is_set():
+                click.echo(f"Warning: Could not read {file_path}: {e}")
             return False
     
-    def _search_in_text_file(self, file_path: str, search_string: str) -> bool:
-        """Search for string in a regular text file."""
+    def _search_in_text_file(self, file_path: str, needle: bytes, file_size: Optional[int] = None) -> bool:
+        """Search for bytes in a regular text file fetched over SFTP."""
         try:
-            # Download and try binary approach to avoid paramiko encoding issues
-            import tempfile
-            with tempfile.NamedTemporaryFile() as temp_file:
-                self.sftp.get(file_path, temp_file.name)
-                
-                with open(temp_file.name, 'rb') as f:
-                    data = f.read()
-                
-                content = self._decode_with_fallback(data, file_path)
-                if content is None:
-                    return False
-                    
-                return search_string in content
+            sftp = self._get_sftp()
+            if file_size is None:
+                file_size = sftp.stat(file_path).st_size
+            
+            # Small files are fetched into memory in one go; larger ones are scanned chunk by chunk
+            if file_size <= IN_MEMORY_SEARCH_LIMIT:
+                buffer = io.BytesIO()
+                sftp.getfo(file_path, buffer)
+                return needle in buffer.getvalue()
+            
+            with self._open_remote(file_path, file_size) as remote_file:
+                return self._stream_contains(remote_file, needle)
                 
         except Exception as e:
-            click.echo(f"Warning: Error reading text file {file_path}: {e}")
+            if not self._search_cancelled.is_set():
+                click.echo(f"Warning: Error reading text file {file_path}: {e}")
             return False
     
-    def _search_in_gz_file(self, file_path: str, search_string: str) -> bool:
-        """Search for string in a gzipped file."""
+    def _search_in_gz_file(self, file_path: str, needle: bytes, file_size: Optional[int] = None) -> bool:
+        """Search for bytes in a gzipped file, decompressing it while it streams over SFTP."""
         try:
-            import tempfile
-            import gzip
-            
-            # Download file to temporary location and decompress
-            with tempfile.NamedTemporaryFile() as temp_file:
-                self.sftp.get(file_path, temp_file.name)
-                
-                with gzip.open(temp_file.name, 'rb') as gz_file:
-                    decompressed_data = gz_file.read()
-                
-                # Try different encodings to decode the content
-                content = self._decode_with_fallback(decompressed_data, file_path)
-                if content is None:
-                    return False
-                
-                # Search for the string  
-                return search_string in content
+            with self._open_remote(file_path, file_size) as remote_file:
+                with gzip_mod.GzipFile(fileobj=remote_file, mode='rb') as reader:
+                    return self._stream_contains(reader, needle)
                     
         except Exception as e:
-            click.echo(f"Warning: Error reading gzip file {file_path}: {e}")
+            if not self._search_cancelled.is_set():
+                click.echo(f"Warning: Error reading gzip file {file_path}: {e}")
             return False
     
-    def _search_in_zst_file(self, file_path: str, search_string: str) -> bool:
-        """Search for string in a zstandard compressed file."""
+    def _search_in_zst_file(self, file_path: str, needle: bytes, file_size: Optional[int] = None) -> bool:
+        """Search for bytes in a zstandard compressed file, decompressing it while it streams over SFTP."""
+        if pyzstd is None and zstandard is None:
+            click.echo(f"Warning: neither zstandard nor pyzstd installed, cannot search {file_path}")
+            return False
+        
         try:
-            import tempfile
-            import pyzstd
-            
-            # Download file to temporary location and decompress
-            with tempfile.NamedTemporaryFile() as temp_file:
-                self.sftp.get(file_path, temp_file.name)
-                
-                with open(temp_file.name, 'rb') as compressed_file:
-                    compressed_data = compressed_file.read()
-                
-                # Decompress the data
-                decompressed_data = pyzstd.decompress(compressed_data)
-                
-                # Try different encodings to decode the content
-                content = self._decode_with_fallback(decompressed_data, file_path)
-                if content is None:
-                    return False
-                
-                # Search for the string
-                return search_string in content
+            with self._open_remote(file_path, file_size) as remote_file:
+                with self._open_decompressor(remote_file, 'zstd') as reader:
+                    return self._stream_contains(reader, needle)
                 
         except Exception as e:
-            click.echo(f"Warning: Error reading zst file {file_path}: {e}")
+            if not self._search_cancelled.is_set():
+                click.echo(f"Warning: Error reading zst file {file_path}: {e}")
             return False
     
-    def _decode_with_fallback(self, data: bytes, file_path: str) -> str:
-        """Try to decode bytes with multiple encodings."""
-        encodings_to_try = ['utf-8', 'latin-1', 'cp1252', 'iso-8859-1', 'ascii']
-        
-        for encoding in encodings_to_try:
-            try:
-                return data.decode(encoding)
-            except UnicodeDecodeError:
-                continue
+    def _stream_contains(self, reader, needle: bytes) -> bool:
+        """Scan a stream chunk by chunk for needle, stopping at the first hit or when the search is cancelled."""
+        # Keep the last len(needle)-1 bytes so matches spanning two chunks are not missed;
+        # only that small seam is joined, the chunk itself is searched without copying
+        keep = len(needle) - 1
+        carry = b''
+        while not self._search_cancelled.is_set() and (chunk := reader.read(COPY_CHUNK_SIZE)):
+            if needle in chunk or (carry and needle in carry + chunk[:keep]):
+                return True
+            if keep:
+                carry = (carry + chunk)[-keep:] if len(chunk) < keep else chunk[-keep:]
+        return False
+    
+    def _decode_with_fallback(self, data: bytes) -> str:
+        """Decode bytes as UTF-8, falling back to latin-1 which accepts any byte sequence."""
+        if data.isascii():
+            return data.decode('ascii')
         
-        # If all encodings fail, try with error handling
         try:
-            return data.decode('utf-8', errors='ignore')
-        except Exception as e:
-            click.echo(f"Warning: Could not decode {file_path} with any encoding: {e}")
-            return None
+            return data.decode('utf-8')
+        except UnicodeDecodeError:
+            pass
+        
+        # latin-1 maps every byte, so it always succeeds and never replaces anything
+        return data.decode('latin-1')
+    
+    def process_file(self, file_path: str, identity: str, output_dir: str, xml_output: str) -> bool:
+        """Download a matching log file, extract its response XML and save it formatted."""
+        click.echo(f"\n📁 Processing: {file_path}")
+        
+        # Download file
+        local_file = self.download_file(file_path, output_dir)
+        if not local_file:
+            click.echo(f"❌ Failed to download {file_path}")
+            return False
+        
+        # Extract XML from line containing identity and GetShipmentResponse
+        xml_content = self.extract_second_response_xml(local_file, identity)
+        if not xml_content:
+            click.echo(f"❌ Failed to extract XML from {local_file}")
+            return False
+        
+        # Format and save XML to extracted folder
+        extracted_dir = Path(output_dir) / "extracted"
+        extracted_dir.mkdir(parents=True, exist_ok=True)
+        
+        stem = file_path.rpartition('/')[2].rsplit('.', 1)[0]
+        output_filename = extracted_dir / f"{stem}_{xml_output}"
+        if self.format_and_save_xml(xml_content, str(output_filename)):
+            click.echo(f"✅ Successfully processed {file_path}")
+            return True
+        
+        click.echo(f"❌ Failed to save XML from {file_path}")
+        return False
     
     def download_file(self, remote_path: str, local_dir: str = "./downloads") -> Optional[str]:
-        """Download a file from the remote server with progress bar."""
+        """Download a file from the remote server with progress bar, decompressing on the fly."""
         try:
             # Create local directory if it doesn't exist
             Path(local_dir).mkdir(parents=True, exist_ok=True)
             
-            # Extract filename from remote path
-            filename = Path(remote_path).name
-            local_path = Path(local_dir) / filename
+            filename = remote_path.rpartition('/')[2]
+            compression, local_path = self._local_target(filename, local_dir)
+            
+            if compression == 'zstd' and pyzstd is None and zstandard is None:
+                click.echo("❌ pyzstd not installed. Please install pyzstd or zstandard to process .zst files.")
+                return None
             
             # Get file size for progress bar
-            file_size = self.sftp.stat(remote_path).st_size
+            file_size = self._get_sftp().stat(remote_path).st_size
             
             click.echo(f"Downloading {remote_path} ({self._format_bytes(file_size)})")
             
-            # Download with progress bar
+            # Download with progress bar, all read requests prefetched ahead of the reader
             with click.progressbar(length=file_size, label='Progress') as bar:
-                def callback(transferred, total):
-                    bar.update(transferred - bar.pos)
-                
-                self.sftp.get(remote_path, str(local_path), callback=callback)
-            
-            # Check if file is compressed and decompress if needed
-            if filename.endswith('.gz'):
-                click.echo("Decompressing gzip file...")
-                decompressed_path = self._decompress_gzip_file(str(local_path))
-                if decompressed_path:
-                    click.echo(f"✅ File downloaded and decompressed (gzip): {decompressed_path}")
-                    return decompressed_path
-            elif filename.endswith('.zst'):
-                click.echo("Decompressing zstd file...")
-                decompressed_path = self._decompress_zst_file(str(local_path))
-                if decompressed_path:
-                    click.echo(f"✅ File downloaded and decompressed (zstd): {decompressed_path}")
-                    return decompressed_path
-            
-            click.echo(f"✅ File downloaded: {local_path}")
+                with self._open_remote(remote_path, file_size) as remote_file, open(local_path, 'wb') as local_file:
+                    # Decompress straight from the SFTP stream - no intermediate compressed file
+                    with self._open_decompressor(remote_file, compression) as reader:
+                        while chunk := reader.read(COPY_CHUNK_SIZE):
+                            local_file.write(chunk)
+                            # Progress tracks transferred (compressed) bytes
+                            bar.update(remote_file.tell() - bar.pos)
+            
+            if compression:
+                click.echo(f"✅ File downloaded and decompressed ({compression}): {local_path}")
+            else:
+                click.echo(f"✅ File downloaded: {local_path}")
             return str(local_path)
             
         except Exception as e:
             click.echo(f"❌ Error downloading file: {e}")
             return None
     
-    def _decompress_gzip_file(self, compressed_path: str) -> Optional[str]:
-        """Decompress a gzipped file."""
-        try:
-            decompressed_path = compressed_path[:-3]  # Remove .gz extension
-            
-            with gzip.open(compressed_path, 'rt', encoding='utf-8') as gz_file:
-                with open(decompressed_path, 'w', encoding='utf-8') as out_file:
-                    out_file.write(gz_file.read())
-            
-            # Remove the compressed file
-            os.remove(compressed_path)
-            return decompressed_path
-            
-        except Exception as e:
-            click.echo(f"❌ Error decompressing gzip file: {e}")
-            return None
+    def _local_target(self, filename: str, local_dir: str) -> Tuple[Optional[str], Path]:
+        """Return the compression of a remote file and the local path of its decompressed copy."""
+        if filename.endswith('.gz'):
+            return 'gzip', Path(local_dir) / filename[:-3]
+        if filename.endswith('.zst'):
+            return 'zstd', Path(local_dir) / filename[:-4]
+        return None, Path(local_dir) / filename
     
-    def _decompress_zst_file(self, compressed_path: str) -> Optional[str]:
-        """Decompress a zstandard (.zst) file."""
-        try:
-            import subprocess
-            
-            # Remove .zst extension for output file
-            decompressed_path = compressed_path[:-4]
-            
-            # Use zstd command-line tool to decompress
-            result = subprocess.run(
-                ['zstd', '-d', compressed_path, '-o', decompressed_path],
-                capture_output=True,
-                text=True
+    def _open_decompressor(self, fileobj, compression: Optional[str]):
+        """Wrap a binary stream in a reader that yields its decompressed content, reading it strictly forward."""
+        if compression == 'gzip':
+            return gzip_mod.GzipFile(fileobj=fileobj, mode='rb')
+        if compression == 'zstd' and zstandard:
+            # Logs may be written as several concatenated frames
+            return self._get_zstd_decompressor().stream_reader(
+                fileobj, read_size=COPY_CHUNK_SIZE, read_across_frames=True
             )
-            
-            if result.returncode != 0:
-                # If zstd command is not available, try using pyzstd if available
-                try:
-                    import pyzstd
-                    with open(compressed_path, 'rb') as f_in:
-                        compressed_data = f_in.read()
-                    
-                    decompressed_data = pyzstd.decompress(compressed_data)
-                    
-                    with open(decompressed_path, 'wb') as f_out:
-                        f_out.write(decompressed_data)
-                    
-                except ImportError:
-                    click.echo("❌ zstd tool not found and pyzstd not installed. Please install zstd or pyzstd.")
-                    return None
-            
-            # Remove the compressed file
-            os.remove(compressed_path)
-            return decompressed_path
-            
-        except Exception as e:
-            click.echo(f"❌ Error decompressing zstd file: {e}")
-            return None
+        if compression == 'zstd':
+            return pyzstd.ZstdFile(fileobj, mode='rb')
+        return fileobj
     
     def extract_second_response_xml(self, file_path: str, identity: str) -> Optional[str]:
         """Extract XML from the line containing both identity and 'GetShipmentResponse'."""
         try:
-            # Try to read the file with different encodings
-            content = None
-            encodings_to_try = ['utf-8', 'latin-1', 'cp1252', 'iso-8859-1']
-            
-            for encoding in encodings_to_try:
-                try:
-                    with open(file_path, 'r', encoding=encoding) as file:
-                        content = file.read()
-                    break
-                except UnicodeDecodeError:
-                    continue
-            
-            # If all encodings fail, try binary mode with fallback decoding
-            if content is None:
-                with open(file_path, 'rb') as file:
-                    data = file.read()
-                content = self._decode_with_fallback(data, file_path)
-                if content is None:
-                    click.echo("❌ Could not decode file with any encoding")
-                    return None
-            
-            # Split into lines and find lines containing both identity and 'GetShipmentResponse'
-            lines = content.split('\n')
-            matching_lines = []
-            
-            for i, line in enumerate(lines):
-                # Check if line contains both identity and GetShipmentResponse (case insensitive)
-                if identity in line and 'getshipmentresponse' in line.lower():
-                    matching_lines.append((i+1, line))
-            
-            if len(matching_lines) == 0:
+            # Tags are ASCII, so the search stays in bytes - only the final XML gets decoded.
+            # The file is memory-mapped, leaving paging to the kernel instead of copying it onto the heap.
+            match = None
+            with open(file_path, 'rb') as file:
+                if os.fstat(file.fileno()).st_size:
+                    with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                        match = self._find_response_line(data, identity.encode('utf-8'))
+            
+            if match is None:
                 click.echo(f"❌ No lines found with both identity '{identity}' and 'GetShipmentResponse'")
                 return None
             
-            click.echo(f"Found {len(matching_lines)} line(s) with identity and GetShipmentResponse")
-            
-            # Get the first matching line
-            matching_line_num, matching_line = matching_lines[0]
+            matching_line_num, matching_line = match
+            click.echo("Found line with identity and GetShipmentResponse")
             click.echo(f"Processing line {matching_line_num}")
             
-            # Look for content between <*:Envelope> ... </*:Envelope> tags
-            # The tag can have different prefixes (soap:, soapenv:, s:, etc.) but must contain "Envelope"
-            
-            # Pattern to match opening tag with "Envelope" in it: <prefix:Envelope ...>
-            envelope_start_pattern = r'<[^>]*Envelope[^>]*>'
-            envelope_start = re.search(envelope_start_pattern, matching_line, re.IGNORECASE)
-            
+            # Look for content between <*:Envelope> ... </*:Envelope> tags.
+            # The tag can have different prefixes (soap:, soapenv:, s:, etc.); the closing tag must use the same one
+            envelope_start = ENVELOPE_START_RE.search(matching_line)
             if not envelope_start:
                 click.echo("❌ No Envelope opening tag found in the line")
                 return None
             
-            # Get the starting position
-            start_pos = envelope_start.start()
-            
-            # Extract the prefix from the opening tag (e.g., "soap:", "s:", "soapenv:")
-            opening_tag = envelope_start.group(0)
-            # Try to find the prefix (text before "Envelope" in the tag)
-            prefix_match = re.search(r'<([^:>\s]*:)?Envelope', opening_tag, re.IGNORECASE)
-            if prefix_match and prefix_match.group(1):
-                prefix = prefix_match.group(1)  # e.g., "soap:", "s:"
+            # The closing tag is a fixed string, so a plain find beats a lazy .*? regex over a huge line
+            closing_tag = b'</' + envelope_start.group(1) + b'Envelope>'
+            end_pos = matching_line.find(closing_tag, envelope_start.end())
+            if end_pos != -1:
+                end_pos += len(closing_tag)
             else:
-                prefix = ""  # No prefix, just <Envelope>
-            
-            # Build the closing tag pattern
-            if prefix:
-                closing_tag = f'</{prefix}Envelope>'
-            else:
-                closing_tag = '</Envelope>'
-            
-            click.echo(f"Looking for closing tag: {closing_tag}")
-            
-            # Find the closing tag
-            xml_part = matching_line[start_pos:]
-            end_pos = xml_part.find(closing_tag)
-            
-            if end_pos == -1:
-                # Try case-insensitive search for closing tag
-                end_pos = xml_part.lower().find(closing_tag.lower())
-                if end_pos != -1:
-                    # Find the actual closing tag with correct case
-                    actual_closing = xml_part[end_pos:end_pos + len(closing_tag)]
-                    end_pos = end_pos + len(actual_closing)
-                else:
-                    click.echo(f"❌ Closing tag {closing_tag} not found")
+                # Rare: closing tag written in a different case than the opening tag
+                closing_match = re.compile(re.escape(closing_tag), re.IGNORECASE).search(matching_line, envelope_start.end())
+                if not closing_match:
+                    click.echo(f"❌ Closing tag {closing_tag.decode('latin-1')} not found")
                     return None
-            else:
-                end_pos = end_pos + len(closing_tag)
+                end_pos = closing_match.end()
             
-            xml_content = xml_part[:end_pos]
+            xml_content = self._decode_with_fallback(matching_line[envelope_start.start():end_pos])
             
             if len(xml_content) > 100:
                 click.echo(f"✅ Found Envelope content ({len(xml_content)} characters)")
@@ -524,66 +681,69 @@ class TransferLogProcessor:
             click.echo(f"❌ Error extracting XML: {e}")
             return None
     
+    def _find_response_line(self, data: mmap.mmap, identity_bytes: bytes) -> Optional[Tuple[int, bytes]]:
+        """Find the first line containing both identity and 'GetShipmentResponse' (case insensitive).
+        
+        Returns the 1-based line number and the line without its newline.
+        """
+        # Jump straight to identity hits instead of visiting every line
+        pos = 0
+        while (hit := data.find(identity_bytes, pos)) != -1:
+            line_start = data.rfind(b'\n', 0, hit) + 1
+            line_end = data.find(b'\n', hit)
+            if line_end == -1:
+                line_end = len(data)
+            line = data[line_start:line_end]
+            # Case-insensitive regex search avoids a lower() copy of every candidate line
+            if RESPONSE_MARKER_RE.search(line):
+                # mmap has no count(), so count newlines before the match block by block
+                line_num = 1 + sum(
+                    data[block:min(block + SCAN_BLOCK_SIZE, line_start)].count(b'\n')
+                    for block in range(0, line_start, SCAN_BLOCK_SIZE)
+                )
+                return line_num, line
+            pos = line_end + 1
+        
+        return None
+    
     def format_and_save_xml(self, xml_content: str, output_file: str = "extracted_response.xml") -> bool:
         """Format XML content nicely and save to file."""
         try:
             # Parse and format the XML
-            try:
-                # Try parsing as XML
-                root = etree.fromstring(xml_content.encode('utf-8'))
-                formatted_xml = etree.tostring(
-                    root, 
-                    pretty_print=True, 
-                    xml_declaration=True, 
-                    encoding='utf-8'
-                ).decode('utf-8')
-            except etree.XMLSyntaxError:
-                # If parsing fails, try to clean up the XML and retry
-                cleaned_xml = self._clean_xml_content(xml_content)
-                root = etree.fromstring(cleaned_xml.encode('utf-8'))
-                formatted_xml = etree.tostring(
-                    root, 
-                    pretty_print=True, 
-                    xml_declaration=True, 
-                    encoding='utf-8'
-                ).decode('utf-8')
-            
-            # Save to file
-            with open(output_file, 'w', encoding='utf-8') as file:
-                file.write(formatted_xml)
+            root = etree.fromstring(xml_content.encode('utf-8'), XML_PARSER)
+            # Serialize straight to the file - no intermediate bytes/str copies of the document
+            etree.ElementTree(root).write(
+                output_file, 
+                pretty_print=True, 
+                xml_declaration=True, 
+                encoding='utf-8'
+            )
             
             click.echo(f"✅ Formatted XML saved to: {output_file}")
             return True
             
+        except etree.XMLSyntaxError as e:
+            # Malformed envelopes are kept exactly as logged rather than partially repaired
+            click.echo(f"❌ Malformed XML, not formatting it: {e}")
+            return self._save_raw_xml(xml_content, output_file)
         except Exception as e:
             click.echo(f"❌ Error formatting XML: {e}")
-            # Save raw content as fallback
-            try:
-                # Ensure parent directory exists
-                Path(output_file).parent.mkdir(parents=True, exist_ok=True)
-                raw_filename = Path(output_file).parent / f"raw_{Path(output_file).name}"
-                
-                with open(raw_filename, 'w', encoding='utf-8') as file:
-                    file.write(xml_content)
-                click.echo(f"⚠️  Saved raw content to: {raw_filename}")
-                return True
-            except Exception as e2:
-                click.echo(f"❌ Error saving raw content: {e2}")
-                return False
+            return self._save_raw_xml(xml_content, output_file)
     
-    def _clean_xml_content(self, xml_content: str) -> str:
-        """Clean XML content to make it parseable."""
-        # Remove common issues that might prevent parsing
-        cleaned = xml_content.strip()
-        
-        # Ensure it starts with XML declaration or root element
-        if not cleaned.startswith('<?xml') and not cleaned.startswith('<'):
-            # Find the first < character
-            start_pos = cleaned.find('<')
-            if start_pos > 0:
-                cleaned = cleaned[start_pos:]
-        
-        return cleaned
+    def _save_raw_xml(self, xml_content: str, output_file: str) -> bool:
+        """Save unformatted XML content next to output_file as a fallback."""
+        try:
+            # Ensure parent directory exists
+            Path(output_file).parent.mkdir(parents=True, exist_ok=True)
+            raw_filename = Path(output_file).parent / f"raw_{Path(output_file).name}"
+            
+            with open(raw_filename, 'w', encoding='utf-8') as file:
+                file.write(xml_content)
+            click.echo(f"⚠️  Saved raw content to: {raw_filename}")
+            return True
+        except Exception as e:
+            click.echo(f"❌ Error saving raw content: {e}")
+            return False
 
 
 @click.command()
@@ -603,8 +763,10 @@ class TransferLogProcessor:
               help='Local directory to save downloaded files')
 @click.option('--xml-output', default='extracted_response.xml', 
               help='Output filename for extracted XML')
+@click.option('--compress/--no-compress', default=False, 
+              help='Enable SSH compression (speeds up plain .log downloads, wasted on .gz/.zst files)')
 def main(hostname, username, key_file, log_dir, alias, 
-         identity, output_dir, xml_output):
+         identity, output_dir, xml_output, compress):
     """
     Download and process transfer logs from SSH server.
     
@@ -615,14 +777,15 @@ def main(hostname, username, key_file, log_dir, alias,
     python main.py --alias zurich --identity "1235435zvcxvsdf"
     python main.py --key-file ~/.ssh/my_key --alias axa --identity "abc123"
     """
-    # Generate file pattern from alias
-    file_pattern = rf'{re.escape(alias)}\.log.*'
+    # Generate file pattern from alias, compiled once for every file name check
+    file_prefix = f'{alias}.log'
+    file_pattern = re.compile(rf'{re.escape(alias)}\.log.*')
     
     click.echo("🚀 Starting Transfer Log Processor")
     click.echo(f"Target server: {username}@{hostname}")
     click.echo(f"Log directory: {log_dir}")
     click.echo(f"File alias: {alias}")
-    click.echo(f"File pattern: {file_pattern}")
+    click.echo(f"File pattern: {file_pattern.pattern}")
     click.echo(f"Identity string: {identity}")
     click.echo("-" * 50)
     
@@ -630,7 +793,8 @@ def main(hostname, username, key_file, log_dir, alias,
     processor = TransferLogProcessor(
         hostname=hostname,
         username=username,
-        key_filename=key_file
+        key_filename=key_file,
+        compress=compress
     )
     
     try:
@@ -639,7 +803,7 @@ def main(hostname, username, key_file, log_dir, alias,
             return 1
         
         # Step 2: Search for log files
-        matching_files = processor.search_log_files(log_dir, file_pattern, identity)
+        matching_files = processor.search_log_files(log_dir, file_pattern, identity, file_prefix)
         
         if not matching_files:
             click.echo("❌ No matching files found!")
@@ -647,31 +811,10 @@ def main(hostname, username, key_file, log_dir, alias,
         
         click.echo(f"✅ Found {len(matching_files)} matching file(s)")
         
-        # Step 3: Process each matching file
+        # Step 3: Process each matching file on the main thread - the search stops at the first
+        # match, so there is nothing to parallelize and no extra SFTP session is needed
         for file_path in matching_files:
-            click.echo(f"\n📁 Processing: {file_path}")
-            
-            # Download file
-            local_file = processor.download_file(file_path, output_dir)
-            if not local_file:
-                click.echo(f"❌ Failed to download {file_path}")
-                continue
-            
-            # Extract XML from line containing identity and GetShipmentResponse
-            xml_content = processor.extract_second_response_xml(local_file, identity)
-            if not xml_content:
-                click.echo(f"❌ Failed to extract XML from {local_file}")
-                continue
-            
-            # Format and save XML to extracted folder
-            extracted_dir = Path(output_dir) / "extracted"
-            extracted_dir.mkdir(parents=True, exist_ok=True)
-            
-            output_filename = extracted_dir / f"{Path(file_path).stem}_{xml_output}"
-            if processor.format_and_save_xml(xml_content, str(output_filename)):
-                click.echo(f"✅ Successfully processed {file_path}")
-            else:
-                click.echo(f"❌ Failed to save XML from {file_path}")
+            processor.process_file(file_path, identity, output_dir, xml_output)
         
         click.echo("\n🎉 Processing completed!")
         return 0